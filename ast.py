@@ -13,6 +13,24 @@ This module defines all AST node classes that represent the structure
 of parsed SPL programs. Each grammar rule maps to a corresponding node class.
 """
 
+import json
+import sys
+
+
+# ============================================
+# STRING INTERNING
+# ============================================
+# Operators, policy types, actions and attribute names take only a few
+# distinct values, so interning them lets every node share one string object.
+def _intern(value):
+    """Intern value if it is a string, otherwise return it unchanged."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_all(values):
+    """Intern every string in a list of values."""
+    return [_intern(v) for v in values]
+
 
 # ============================================
 # BASE AST NODE CLASS
@@ -22,11 +40,32 @@ class ASTNode:
     Base class for all AST nodes.
     All nodes inherit from this class and track line numbers for error reporting.
     """
+    # No per-instance __dict__: smaller nodes and faster attribute access
+    __slots__ = ('line_number',)
+    
+    # Class name, stored once per class for ast_to_dict/ast_to_json
+    _type_name = 'ASTNode'
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._type_name = cls.__name__
+    
     def __init__(self, line_num=0):
         self.line_number = line_num
     
+    # Minimal repr; the detailed form is built only by __str__ (used by print_ast)
     def __repr__(self):
-        return f"{self.__class__.__name__}(line={self.line_number})"
+        return f"{self._type_name}(line={self.line_number})"
+    
+    def __str__(self):
+        return _node_text(self)
+    
+    def _text(self, text):
+        """
+        Detailed form of this node, used by __str__.
+        text(child) returns the already built detailed form of a child node.
+        """
+        return repr(self)
 
 
 # ============================================
@@ -37,11 +76,13 @@ class ProgramNode(ASTNode):
     Root node representing an entire SPL program.
     Contains a list of declarations (roles, users, resources, policies).
     """
+    __slots__ = ('declarations',)
+    
     def __init__(self, declarations, line_num=0):
         super().__init__(line_num)
         self.declarations = declarations  # List of declaration nodes
     
-    def __repr__(self):
+    def _text(self, text):
         return f"ProgramNode({len(self.declarations)} declarations)"
 
 
@@ -53,12 +94,14 @@ class RoleDefNode(ASTNode):
     Represents a role definition.
     Example: ROLE Admin {can: *}
     """
+    __slots__ = ('name', 'actions')
+    
     def __init__(self, name, actions, line_num=0):
         super().__init__(line_num)
         self.name = name          # String: 'Admin'
-        self.actions = actions    # List of strings or ['*'] for wildcard
+        self.actions = _intern_all(actions)  # List of strings or ['*'] for wildcard
     
-    def __repr__(self):
+    def _text(self, text):
         actions_str = '*' if self.actions == ['*'] else ', '.join(self.actions)
         return f"RoleDefNode(name='{self.name}', actions=[{actions_str}])"
 
@@ -68,12 +111,14 @@ class UserDefNode(ASTNode):
     Represents a user definition.
     Example: USER JaneDoe {role: Developer}
     """
+    __slots__ = ('name', 'role')
+    
     def __init__(self, name, role, line_num=0):
         super().__init__(line_num)
         self.name = name  # String: 'JaneDoe'
         self.role = role  # String: 'Developer'
     
-    def __repr__(self):
+    def _text(self, text):
         return f"UserDefNode(name='{self.name}', role='{self.role}')"
 
 
@@ -82,12 +127,14 @@ class ResourceDefNode(ASTNode):
     Represents a resource definition.
     Example: RESOURCE DB_Finance {path: "/data/financial"}
     """
+    __slots__ = ('name', 'path')
+    
     def __init__(self, name, path, line_num=0):
         super().__init__(line_num)
         self.name = name  # String: 'DB_Finance'
         self.path = path  # String: '/data/financial'
     
-    def __repr__(self):
+    def _text(self, text):
         return f"ResourceDefNode(name='{self.name}', path='{self.path}')"
 
 
@@ -96,16 +143,18 @@ class PolicyNode(ASTNode):
     Represents a policy definition (ALLOW or DENY).
     Example: ALLOW action: read, write ON resource: DB_Finance IF (time.hour > 9)
     """
+    __slots__ = ('policy_type', 'actions', 'resources', 'condition')
+    
     def __init__(self, policy_type, actions, resources, condition=None, line_num=0):
         super().__init__(line_num)
-        self.policy_type = policy_type  # String: 'ALLOW' or 'DENY'
-        self.actions = actions          # List of strings: ['read', 'write'] or ['*']
+        self.policy_type = _intern(policy_type)  # String: 'ALLOW' or 'DENY'
+        self.actions = _intern_all(actions)      # List of strings: ['read', 'write'] or ['*']
         self.resources = resources      # String or list: 'DB_Finance' or '/data/*'
         self.condition = condition      # ConditionNode or None
     
-    def __repr__(self):
+    def _text(self, text):
         actions_str = '*' if self.actions == ['*'] else ', '.join(self.actions)
-        cond_str = f", condition={self.condition}" if self.condition else ""
+        cond_str = f", condition={text(self.condition)}" if self.condition else ""
         return f"PolicyNode(type='{self.policy_type}', actions=[{actions_str}], resources='{self.resources}'{cond_str})"
 
 
@@ -117,14 +166,16 @@ class ConditionNode(ASTNode):
     Represents a boolean condition (AND/OR).
     Example: time.hour > 9 AND time.hour < 17
     """
+    __slots__ = ('operator', 'left', 'right')
+    
     def __init__(self, operator, left, right, line_num=0):
         super().__init__(line_num)
-        self.operator = operator  # String: 'AND' or 'OR'
+        self.operator = _intern(operator)  # String: 'AND' or 'OR'
         self.left = left          # ComparisonNode or ConditionNode
         self.right = right        # ComparisonNode or ConditionNode
     
-    def __repr__(self):
-        return f"ConditionNode(operator='{self.operator}', left={self.left}, right={self.right})"
+    def _text(self, text):
+        return f"ConditionNode(operator='{self.operator}', left={text(self.left)}, right={text(self.right)})"
 
 
 class ComparisonNode(ASTNode):
@@ -132,14 +183,16 @@ class ComparisonNode(ASTNode):
     Represents a comparison expression.
     Example: time.hour > 9, user.role == Admin
     """
+    __slots__ = ('operator', 'left', 'right')
+    
     def __init__(self, operator, left, right, line_num=0):
         super().__init__(line_num)
-        self.operator = operator  # String: '==', '!=', '<', '>', '<=', '>='
+        self.operator = _intern(operator)  # String: '==', '!=', '<', '>', '<=', '>='
         self.left = left          # ArithmeticExprNode or AttributeAccessNode or LiteralNode
         self.right = right        # ArithmeticExprNode or AttributeAccessNode or LiteralNode
     
-    def __repr__(self):
-        return f"ComparisonNode(operator='{self.operator}', left={self.left}, right={self.right})"
+    def _text(self, text):
+        return f"ComparisonNode(operator='{self.operator}', left={text(self.left)}, right={text(self.right)})"
 
 
 class ArithmeticExprNode(ASTNode):
@@ -147,14 +200,16 @@ class ArithmeticExprNode(ASTNode):
     Represents an arithmetic expression with binary operators.
     Example: 3 + 4 * 10, time.hour * 2 + 5
     """
+    __slots__ = ('operator', 'left', 'right')
+    
     def __init__(self, operator, left, right, line_num=0):
         super().__init__(line_num)
-        self.operator = operator  # String: '+', '-', '*', '/'
+        self.operator = _intern(operator)  # String: '+', '-', '*', '/'
         self.left = left          # ArithmeticExprNode, FactorNode, or LiteralNode
         self.right = right        # ArithmeticExprNode, FactorNode, or LiteralNode
     
-    def __repr__(self):
-        return f"ArithmeticExprNode(operator='{self.operator}', left={self.left}, right={self.right})"
+    def _text(self, text):
+        return f"ArithmeticExprNode(operator='{self.operator}', left={text(self.left)}, right={text(self.right)})"
 
 
 class UnaryExprNode(ASTNode):
@@ -162,13 +217,15 @@ class UnaryExprNode(ASTNode):
     Represents a unary expression (+ or -).
     Example: -5, +10
     """
+    __slots__ = ('operator', 'operand')
+    
     def __init__(self, operator, operand, line_num=0):
         super().__init__(line_num)
-        self.operator = operator  # String: '+' or '-'
+        self.operator = _intern(operator)  # String: '+' or '-'
         self.operand = operand    # FactorNode or LiteralNode
     
-    def __repr__(self):
-        return f"UnaryExprNode(operator='{self.operator}', operand={self.operand})"
+    def _text(self, text):
+        return f"UnaryExprNode(operator='{self.operator}', operand={text(self.operand)})"
 
 
 class AttributeAccessNode(ASTNode):
@@ -176,12 +233,14 @@ class AttributeAccessNode(ASTNode):
     Represents attribute access (dot notation).
     Example: time.hour, user.role
     """
+    __slots__ = ('object_name', 'attribute_name')
+    
     def __init__(self, object_name, attribute_name, line_num=0):
         super().__init__(line_num)
-        self.object_name = object_name      # String: 'time'
-        self.attribute_name = attribute_name  # String: 'hour'
+        self.object_name = _intern(object_name)        # String: 'time'
+        self.attribute_name = _intern(attribute_name)  # String: 'hour'
     
-    def __repr__(self):
+    def _text(self, text):
         return f"AttributeAccessNode(object='{self.object_name}', attribute='{self.attribute_name}')"
 
 
@@ -193,11 +252,13 @@ class IdentifierNode(ASTNode):
     Represents an identifier (variable name, role name, etc.).
     Example: Admin, JaneDoe, DB_Finance
     """
+    __slots__ = ('value',)
+    
     def __init__(self, value, line_num=0):
         super().__init__(line_num)
         self.value = value  # String
     
-    def __repr__(self):
+    def _text(self, text):
         return f"IdentifierNode(value='{self.value}')"
 
 
@@ -206,11 +267,13 @@ class NumberNode(ASTNode):
     Represents a number literal.
     Example: 9, 17, 100
     """
+    __slots__ = ('value',)
+    
     def __init__(self, value, line_num=0):
         super().__init__(line_num)
         self.value = value  # Integer
     
-    def __repr__(self):
+    def _text(self, text):
         return f"NumberNode(value={self.value})"
 
 
@@ -219,11 +282,13 @@ class StringNode(ASTNode):
     Represents a string literal.
     Example: "/data/financial", "read"
     """
+    __slots__ = ('value',)
+    
     def __init__(self, value, line_num=0):
         super().__init__(line_num)
         self.value = value  # String
     
-    def __repr__(self):
+    def _text(self, text):
         return f"StringNode(value='{self.value}')"
 
 
@@ -232,125 +297,285 @@ class WildcardNode(ASTNode):
     Represents a wildcard (*) in action lists.
     Example: {can: *}
     """
+    __slots__ = ('value',)
+    
     def __init__(self, line_num=0):
         super().__init__(line_num)
         self.value = '*'  # Always '*'
     
-    def __repr__(self):
+    def _text(self, text):
         return "WildcardNode()"
 
 
+# ============================================
+# DETAILED TEXT FORM
+# ============================================
+# Children that appear inside each node type's detailed text (see _text)
+_TEXT_CHILDREN = {
+    ConditionNode: lambda node: (node.left, node.right),
+    ComparisonNode: lambda node: (node.left, node.right),
+    ArithmeticExprNode: lambda node: (node.left, node.right),
+    UnaryExprNode: lambda node: (node.operand,),
+    PolicyNode: lambda node: (node.condition,),
+}
+
+
+def _node_text(node, texts=None):
+    """
+    Build the detailed text of node (what str(node) returns).
+    Children are formatted before their parents using an explicit stack, so
+    deep condition chains cannot hit the recursion limit. texts maps id(node)
+    to finished text and may be shared between calls to reuse sub-trees.
+    """
+    if texts is None:
+        texts = {}
+    
+    def text(child):
+        return texts[id(child)] if isinstance(child, ASTNode) else f"{child}"
+    
+    stack = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+        if id(current) in texts:
+            continue
+        if children_done:
+            texts[id(current)] = current._text(text)
+            continue
+        stack.append((current, True))
+        children = _TEXT_CHILDREN.get(type(current))
+        if children:
+            for child in children(current):
+                if isinstance(child, ASTNode):
+                    stack.append((child, False))
+    
+    return texts[id(node)]
+
+
 # ============================================
 # VISUALIZATION METHODS
 # ============================================
+# Children of each node type, as (child, prefix) pairs, used by print_ast.
+# Looking up type(node) replaces a chain of isinstance checks.
+def _program_children(node):
+    last = len(node.declarations) - 1
+    return tuple((decl, "└── " if i == last else "├── ")
+                 for i, decl in enumerate(node.declarations))
+
+
+def _binary_children(node):
+    return ((node.left, "├── "), (node.right, "└── "))
+
+
+def _unary_children(node):
+    return ((node.operand, "└── "),)
+
+
+def _policy_children(node):
+    if node.condition:
+        return ((node.condition, "└── condition: "),)
+    return ()
+
+
+_CHILDREN_ACCESSORS = {
+    ProgramNode: _program_children,
+    ConditionNode: _binary_children,
+    ComparisonNode: _binary_children,
+    ArithmeticExprNode: _binary_children,
+    UnaryExprNode: _unary_children,
+    PolicyNode: _policy_children,
+}
+
+
+# Indentation string for each tree level, extended on demand by _emit
+_INDENTS = ["  " * level for level in range(16)]
+
+
 def print_ast(node, indent=0, prefix=""):
     """
     Pretty-print the AST tree structure.
     Useful for debugging and documentation.
     """
-    if node is None:
-        return
-    
-    # Print current node
-    print("  " * indent + prefix + str(node))
-    
-    # Recursively print children
-    if isinstance(node, ProgramNode):
-        for i, decl in enumerate(node.declarations):
-            is_last = (i == len(node.declarations) - 1)
-            print_ast(decl, indent + 1, "├── " if not is_last else "└── ")
-    
-    elif isinstance(node, ConditionNode):
-        print_ast(node.left, indent + 1, "├── ")
-        print_ast(node.right, indent + 1, "└── ")
-    
-    elif isinstance(node, ComparisonNode):
-        print_ast(node.left, indent + 1, "├── ")
-        print_ast(node.right, indent + 1, "└── ")
-    
-    elif isinstance(node, ArithmeticExprNode):
-        print_ast(node.left, indent + 1, "├── ")
-        print_ast(node.right, indent + 1, "└── ")
-    
-    elif isinstance(node, UnaryExprNode):
-        print_ast(node.operand, indent + 1, "└── ")
-    
-    elif isinstance(node, PolicyNode):
-        if node.condition:
-            print_ast(node.condition, indent + 1, "└── condition: ")
+    # Collect every line first and write them in one call
+    out = []
+    _emit(node, indent, prefix, out)
+    if out:
+        sys.stdout.write("\n".join(out) + "\n")
 
 
-def ast_to_dict(node):
+def _emit(node, indent, prefix, out):
     """
-    Convert AST node to dictionary representation.
-    Useful for JSON serialization and LLM integration.
+    Worker for print_ast.
+    Appends one line per node to out instead of printing it. Uses an explicit
+    stack rather than recursion, and builds each line's text with _node_text
+    (sharing one texts memo), so deep condition chains cannot hit the
+    recursion limit and each sub-tree's text is built only once.
     """
-    if node is None:
-        return None
-    
+    texts = {}
+    stack = [(node, indent, prefix)]
+    while stack:
+        node, indent, prefix = stack.pop()
+        if node is None:
+            continue
+        
+        # Current node
+        try:
+            pad = _INDENTS[indent]
+        except IndexError:
+            while len(_INDENTS) <= indent:
+                _INDENTS.append(_INDENTS[-1] + "  ")
+            pad = _INDENTS[indent]
+        out.append(pad + prefix + _node_text(node, texts))
+        
+        # Push children in reverse so the first child is printed first
+        accessor = _CHILDREN_ACCESSORS.get(type(node))
+        if accessor:
+            for child, child_prefix in reversed(accessor(node)):
+                stack.append((child, indent + 1, child_prefix))
+
+
+# Dictionary fields of each node type, used by ast_to_dict and ast_to_json.
+# Each handler takes (node, convert) and returns the fields beyond 'type' and
+# 'line'; convert is applied to every child node.
+def _program_fields(node, convert):
+    return {'declarations': [convert(d) for d in node.declarations]}
+
+
+def _role_fields(node, convert):
+    return {'name': node.name, 'actions': node.actions}
+
+
+def _user_fields(node, convert):
+    return {'name': node.name, 'role': node.role}
+
+
+def _resource_fields(node, convert):
+    return {'name': node.name, 'path': node.path}
+
+
+def _policy_fields(node, convert):
+    fields = {
+        'policy_type': node.policy_type,
+        'actions': node.actions,
+        'resources': node.resources,
+    }
+    if node.condition:
+        fields['condition'] = convert(node.condition)
+    return fields
+
+
+def _binary_fields(node, convert):
+    return {
+        'operator': node.operator,
+        'left': convert(node.left),
+        'right': convert(node.right),
+    }
+
+
+def _unary_fields(node, convert):
+    return {'operator': node.operator, 'operand': convert(node.operand)}
+
+
+def _attribute_fields(node, convert):
+    return {'object': node.object_name, 'attribute': node.attribute_name}
+
+
+def _value_fields(node, convert):
+    return {'value': node.value}
+
+
+def _wildcard_fields(node, convert):
+    return {'value': '*'}
+
+
+_TO_DICT_HANDLERS = {
+    ProgramNode: _program_fields,
+    RoleDefNode: _role_fields,
+    UserDefNode: _user_fields,
+    ResourceDefNode: _resource_fields,
+    PolicyNode: _policy_fields,
+    ConditionNode: _binary_fields,
+    ComparisonNode: _binary_fields,
+    ArithmeticExprNode: _binary_fields,
+    UnaryExprNode: _unary_fields,
+    AttributeAccessNode: _attribute_fields,
+    IdentifierNode: _value_fields,
+    NumberNode: _value_fields,
+    StringNode: _value_fields,
+    WildcardNode: _wildcard_fields,
+}
+
+
+def _node_fields(node, convert):
+    """Return the dictionary form of a single node, converting children with convert."""
     result = {
-        'type': node.__class__.__name__,
+        'type': node._type_name,
         'line': node.line_number
     }
     
-    if isinstance(node, ProgramNode):
-        result['declarations'] = [ast_to_dict(d) for d in node.declarations]
-    
-    elif isinstance(node, RoleDefNode):
-        result['name'] = node.name
-        result['actions'] = node.actions
-    
-    elif isinstance(node, UserDefNode):
-        result['name'] = node.name
-        result['role'] = node.role
-    
-    elif isinstance(node, ResourceDefNode):
-        result['name'] = node.name
-        result['path'] = node.path
-    
-    elif isinstance(node, PolicyNode):
-        result['policy_type'] = node.policy_type
-        result['actions'] = node.actions
-        result['resources'] = node.resources
-        if node.condition:
-            result['condition'] = ast_to_dict(node.condition)
-    
-    elif isinstance(node, ConditionNode):
-        result['operator'] = node.operator
-        result['left'] = ast_to_dict(node.left)
-        result['right'] = ast_to_dict(node.right)
-    
-    elif isinstance(node, ComparisonNode):
-        result['operator'] = node.operator
-        result['left'] = ast_to_dict(node.left)
-        result['right'] = ast_to_dict(node.right)
-    
-    elif isinstance(node, ArithmeticExprNode):
-        result['operator'] = node.operator
-        result['left'] = ast_to_dict(node.left)
-        result['right'] = ast_to_dict(node.right)
-    
-    elif isinstance(node, UnaryExprNode):
-        result['operator'] = node.operator
-        result['operand'] = ast_to_dict(node.operand)
-    
-    elif isinstance(node, AttributeAccessNode):
-        result['object'] = node.object_name
-        result['attribute'] = node.attribute_name
-    
-    elif isinstance(node, IdentifierNode):
-        result['value'] = node.value
-    
-    elif isinstance(node, NumberNode):
-        result['value'] = node.value
+    handler = _TO_DICT_HANDLERS.get(type(node))
+    if handler:
+        result.update(handler(node, convert))
+    return result
+
+
+def ast_to_dict(node):
+    """
+    Convert AST node to dictionary representation.
+    Useful for JSON serialization and LLM integration.
+    A sub-tree referenced by several parents is converted once, so it comes
+    back as the same dict object at every position; copy it before
+    modifying one position independently.
+    """
+    # memo maps id(node) to its finished dictionary, so a sub-tree that is
+    # shared by several parents is only converted once
+    memo = {}
     
-    elif isinstance(node, StringNode):
-        result['value'] = node.value
+    def convert(child):
+        return None if child is None else memo[id(child)]
     
-    elif isinstance(node, WildcardNode):
-        result['value'] = '*'
+    # Iterative post-order traversal: a node is converted on its second visit,
+    # after all of its children are in memo. Avoids one Python frame per node
+    # and the recursion limit on long condition chains.
+    stack = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+        if current is None or id(current) in memo:
+            continue
+        if children_done:
+            memo[id(current)] = _node_fields(current, convert)
+            continue
+        stack.append((current, True))
+        accessor = _CHILDREN_ACCESSORS.get(type(current))
+        if accessor:
+            for child, _ in accessor(current):
+                stack.append((child, False))
     
-    return result
+    return convert(node)
+
+
+def _json_default(obj):
+    """
+    json default hook: serialize one AST node at a time.
+    Child nodes are left as-is and reach this hook again when the encoder
+    gets to them, so no intermediate dictionary tree is built.
+    """
+    if isinstance(obj, ASTNode):
+        return _node_fields(obj, _keep)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _keep(child):
+    """Leave child nodes for the JSON encoder to pass back to _json_default."""
+    return child
+
+
+def ast_to_json(node, indent=2):
+    """
+    Serialize an AST directly to a JSON string.
+    Produces the same JSON as json.dumps(ast_to_dict(node), indent=indent)
+    in a single pass.
+    """
+    return json.dumps(node, default=_json_default, indent=indent)
 
 
 # ============================================
@@ -411,6 +636,5 @@ if __name__ == "__main__":
     # Print as dictionary
     print("\n" + "=" * 60)
     print("AST as Dictionary (for JSON/LLM):")
-    import json
-    print(json.dumps(ast_to_dict(program), indent=2))
+    print(ast_to_json(program))
 
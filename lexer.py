@@ -13,6 +13,8 @@ This module implements the lexical analyzer (tokenizer) for SPL.
 It recognizes all tokens including keywords, operators, literals, and punctuation.
 """
 
+import hashlib
+
 import ply.lex as lex
 
 # ============================================
@@ -61,273 +63,104 @@ tokens = (
 # Keywords dictionary - maps keyword strings to token types
 # Note: 'can', 'role', 'path', 'action', 'resource' are attribute name keywords
 # They are recognized as special tokens for stricter parsing
-# Case-insensitive matching - both 'can' and 'CAN' map to 'CAN' token
-keywords = {
-    'ROLE': 'ROLE',
-    'USER': 'USER',
-    'RESOURCE': 'RESOURCE',
-    'ALLOW': 'ALLOW',
-    'DENY': 'DENY',
-    'IF': 'IF',
-    'ON': 'ON',
-    'AND': 'AND',
-    'OR': 'OR',
-    'CAN': 'CAN',
-    'PATH': 'PATH',
-    'ACTION': 'ACTION',
-    # Also add lowercase versions for case-insensitive matching in t_IDENTIFIER
-    'can': 'CAN',
-    'path': 'PATH',
-    'action': 'ACTION',
-}
+keywords = {k: k for k in (
+    'ROLE', 'USER', 'RESOURCE', 'ALLOW', 'DENY', 'IF', 'ON', 'AND', 'OR',
+    'CAN', 'PATH', 'ACTION',
+)}
+
+# Keywords matched case-insensitively - both 'can' and 'CAN' map to 'CAN' token
+# All other keywords are case-sensitive, so 'role' and 'resource' stay identifiers
+case_insensitive_keywords = frozenset(('CAN', 'PATH', 'ACTION'))
 
 # ============================================
 # REGULAR EXPRESSIONS FOR TOKENS
 # ============================================
-# Note: PLY matches tokens in the order they appear in the file.
-# Functions are matched in order of definition, so multi-character patterns
-# should be defined before single-character patterns.
-
-# Keywords (case-sensitive)
-def t_ROLE(t):
-    r'ROLE'
-    return t
-
-def t_USER(t):
-    r'USER'
-    return t
-
-def t_RESOURCE(t):
-    r'RESOURCE'
-    return t
-
-def t_ALLOW(t):
-    r'ALLOW'
-    return t
-
-def t_DENY(t):
-    r'DENY'
-    return t
-
-def t_IF(t):
-    r'IF'
-    return t
-
-def t_ON(t):
-    r'ON'
-    return t
+# Note: PLY tries function rules first, in order of definition, and then
+# string rules sorted by decreasing regex length (so '>=' is tried before '>').
+# Rules that only match text are plain strings, which the regex engine handles
+# without a Python callback. Functions are kept for rules that do extra work.
 
-def t_AND(t):
-    r'AND'
-    return t
+# Characters after which a '*' is a wildcard (COLON or COMMA token)
+wildcard_prev_chars = ':,'
 
-def t_OR(t):
-    r'OR'
-    return t
-
-def t_CAN(t):
-    r'[Cc][Aa][Nn]'  # Matches 'can' or 'CAN' (case-insensitive)
-    # Normalize to uppercase for token type
-    t.value = t.value.upper()
-    return t
-
-def t_PATH(t):
-    r'[Pp][Aa][Tt][Hh]'  # Matches 'path' or 'PATH' (case-insensitive)
-    # Normalize to uppercase for token type
-    t.value = t.value.upper()
-    return t
-
-def t_ACTION(t):
-    r'[Aa][Cc][Tt][Ii][Oo][Nn]'  # Matches 'action' or 'ACTION' (case-insensitive)
-    # Normalize to uppercase for token type
-    t.value = t.value.upper()
-    return t
-
-# Comparison Operators (multi-character - must come before single-character)
-def t_GE(t):
-    r'>='
-    return t
-
-def t_LE(t):
-    r'<='
-    return t
-
-def t_EQ(t):
-    r'=='
-    return t
-
-def t_NE(t):
-    r'!='
-    return t
+def _brace_depth(lexer, pos):
+    """
+    Return the number of '{' open at pos for this lexer.
+    The count is stored on the lexer object itself, so every lexer built from
+    these rules (clones and lex.lex(module=...) included) tracks its own.
+    It starts again from 0 when a new input() begins, detected by different
+    lexdata or by pos moving backwards.
+    """
+    if getattr(lexer, 'brace_data', None) is not lexer.lexdata or pos < lexer.brace_pos:
+        lexer.brace_data = lexer.lexdata
+        lexer.brace_depth = 0
+    lexer.brace_pos = pos
+    return lexer.brace_depth
+
+# Keywords are not given their own rules. They are matched by t_IDENTIFIER
+# and resolved through the keywords dictionary, so the master regex needs a
+# single alternative for every word-like token.
+
+# Comparison Operators (multi-character)
+t_GE = r'>='
+t_LE = r'<='
+t_EQ = r'=='
+t_NE = r'!='
 
 # Arithmetic Operators
-def t_PLUS(t):
-    r'\+'
-    return t
-
-def t_MINUS(t):
-    r'-'
-    return t
+t_PLUS = r'\+'
+t_MINUS = r'-'
 
 def t_TIMES(t):
     r'\*'
     # Determine if * is wildcard or multiplication based on context
-    # Look at surrounding characters to determine context
-    
-    # Get the position in the input string
-    pos = t.lexer.lexpos
-    data = t.lexer.lexdata
-    
-    # Check what comes before the *
-    before_start = max(0, pos - 30)  # Look back up to 30 chars
-    before_text = data[before_start:pos]
-    
-    # Check what comes after the *
-    after_end = min(len(data), pos + 1 + 30)  # Look ahead up to 30 chars
-    after_text = data[pos + 1:after_end]
-    
-    # Wildcard context: * appears after COLON (especially after attribute keywords)
+    # Wildcard context: * follows a COLON or COMMA, or appears inside braces
     # Examples: {can: *}, action: *, {can: read, *}
-    is_wildcard = False
-    
-    # Check if we're in an attribute context (after COLON)
-    # Look for patterns like "can:", "action:", "path:" followed by whitespace and *
-    before_stripped = before_text.strip()
-    
-    # Check if there's a colon before the *
-    if ':' in before_stripped:
-        # Find the last colon before this position
-        last_colon_pos = before_stripped.rfind(':')
-        if last_colon_pos >= 0:
-            # Get text between colon and *
-            between = before_stripped[last_colon_pos + 1:].strip()
-            
-            # If there's only whitespace between : and *, it's likely a wildcard
-            if not between or between == '':
-                # Check what comes after - should be }, ,, whitespace, or keyword (ON, IF, etc.)
-                after_stripped = after_text.strip()
-                if (after_stripped.startswith('}') or 
-                    after_stripped.startswith(',') or 
-                    not after_stripped or 
-                    after_stripped[0].isspace() or
-                    after_stripped.startswith('ON') or
-                    after_stripped.startswith('IF') or
-                    after_stripped.startswith('AND') or
-                    after_stripped.startswith('OR')):
-                    is_wildcard = True
-    
-    # Also check if we're inside braces { } which is a strong indicator of wildcard
-    # Count braces before this position
-    before_full = data[before_start:pos]
-    open_braces = before_full.count('{')
-    close_braces = before_full.count('}')
-    if open_braces > close_braces:  # We're inside braces
-        if ':' in before_stripped:  # And there's a colon nearby
-            is_wildcard = True
-    
-    # Check for attribute keywords before colon (can, action, path)
-    # This helps catch cases like "action: *" outside braces
-    # Note: "action:" is tokenized as "ACTION COLON", so we need to check for the keyword
-    if ':' in before_stripped:
-        # Look for attribute keywords before the colon (case-insensitive)
-        before_colon = before_stripped[:before_stripped.rfind(':')].strip().lower()
-        # Check if it ends with can, action, or path (the actual words, not tokenized)
-        if (before_colon.endswith('can') or 
-            before_colon.endswith('action') or 
-            before_colon.endswith('path') or
-            before_colon.endswith('can ') or
-            before_colon.endswith('action ') or
-            before_colon.endswith('path ')):
-            # Check if there's only whitespace between colon and *
-            between = before_stripped[before_stripped.rfind(':') + 1:].strip()
-            if not between or between == '':
-                is_wildcard = True
-    
-    # Also check if we see "ON", "IF", "AND", "OR" after the * - this indicates wildcard context
-    # in policy definitions like "action: * ON resource: ..."
-    after_stripped = after_text.strip()
-    if after_stripped.startswith('ON') or after_stripped.startswith('IF'):
-        # If we're after a colon with attribute keyword, it's wildcard
-        if ':' in before_stripped:
-            before_colon = before_stripped[:before_stripped.rfind(':')].strip().lower()
-            if (before_colon.endswith('can') or 
-                before_colon.endswith('action') or 
-                before_colon.endswith('path')):
-                is_wildcard = True
-    
-    # Multiplication context: * appears between numbers or identifiers
+    # Multiplication context: anything else (after a number, identifier or ')')
     # Examples: 3 * 4, time.hour * 2, (a * b)
-    is_multiplication = False
-    if not is_wildcard:
-        # Check if there's a number or identifier before
-        before_clean = before_stripped.replace(' ', '').replace('\t', '').replace('\n', '')
-        after_clean = after_text.strip().replace(' ', '').replace('\t', '').replace('\n', '')
-        
-        # If we have something like "number *" or "identifier *" followed by number/identifier
-        if (before_clean and (before_clean[-1].isdigit() or before_clean[-1].isalpha() or before_clean[-1] == ')')) and \
-           (after_clean and (after_clean[0].isdigit() or after_clean[0].isalpha() or after_clean[0] == '(')):
-            is_multiplication = True
-        # Also check if we're in an arithmetic expression context
-        elif before_clean and (before_clean[-1].isdigit() or before_clean[-1].isalpha() or before_clean[-1] == ')'):
-            # If followed by number, identifier, or operator, it's multiplication
-            if after_clean and (after_clean[0].isdigit() or after_clean[0].isalpha() or after_clean[0] == '('):
-                is_multiplication = True
-    
-    # Default to multiplication if context is unclear (safer for arithmetic)
-    if is_wildcard:
+    if _brace_depth(t.lexer, t.lexpos) > 0:
         t.type = 'WILDCARD'
-    else:
-        t.type = 'TIMES'
+        return t
     
+    # Nearest non-blank character before the *
+    data = t.lexer.lexdata
+    pos = t.lexpos - 1
+    while pos >= 0 and data[pos] in ' \t\r\n':
+        pos -= 1
+    if pos >= 0 and data[pos] in wildcard_prev_chars:
+        t.type = 'WILDCARD'
     return t
 
-def t_DIVIDE(t):
-    r'/'
-    return t
+t_DIVIDE = r'/'
 
 # Comparison Operators (single-character)
-def t_GT(t):
-    r'>'
-    return t
-
-def t_LT(t):
-    r'<'
-    return t
+t_GT = r'>'
+t_LT = r'<'
 
 # Punctuation and Delimiters
 def t_LBRACE(t):
     r'\{'
+    # Track nesting so t_TIMES can tell a '*' is inside braces
+    t.lexer.brace_depth = _brace_depth(t.lexer, t.lexpos) + 1
     return t
 
 def t_RBRACE(t):
     r'\}'
+    t.lexer.brace_depth = max(0, _brace_depth(t.lexer, t.lexpos) - 1)
     return t
 
-def t_LPAREN(t):
-    r'\('
-    return t
-
-def t_RPAREN(t):
-    r'\)'
-    return t
-
-def t_COLON(t):
-    r':'
-    return t
-
-def t_DOT(t):
-    r'\.'
-    return t
-
-def t_COMMA(t):
-    r','
-    return t
+t_LPAREN = r'\('
+t_RPAREN = r'\)'
+t_COLON = r':'
+t_DOT = r'\.'
+t_COMMA = r','
 
 # Literals
 def t_STRING(t):
-    r'"[^"]*"'
-    # Remove quotes from string value
-    t.value = t.value[1:-1]
+    r'"(?P<string_body>[^"]*)"'
+    # Use the text between the quotes as the value
+    # (a named group, since PLY wraps every rule in its own group)
+    t.value = t.lexer.lexmatch.group('string_body')
     return t
 
 def t_NUMBER(t):
@@ -339,8 +172,15 @@ def t_NUMBER(t):
 def t_IDENTIFIER(t):
     r'[a-zA-Z_][a-zA-Z0-9_]*'
     # Check if identifier is a keyword
-    # Keywords are case-sensitive and must match exactly
-    t.type = keywords.get(t.value, 'IDENTIFIER')
+    upper = t.value.upper()
+    t.type = keywords.get(upper, 'IDENTIFIER')
+    if t.type != 'IDENTIFIER':
+        if t.value != upper and t.type not in case_insensitive_keywords:
+            # Case-sensitive keyword written in another case
+            t.type = 'IDENTIFIER'
+        else:
+            # Normalize keyword values to uppercase
+            t.value = upper
     return t
 
 # Special token definitions
@@ -364,7 +204,26 @@ def t_error(t):
 # ============================================
 # BUILD THE LEXER
 # ============================================
-lexer = lex.lex()
+def _rules_signature():
+    """
+    Short hash of everything the cached token table is built from: the token
+    names, the ignored characters, and every rule's name, kind, regex and (for
+    functions) definition order.
+    """
+    parts = [repr(tokens), repr(t_ignore)]
+    for name, rule in sorted(globals().items()):
+        if not name.startswith('t_') or name == 't_ignore':
+            continue
+        if callable(rule):
+            parts.append(f"{name} function {rule.__code__.co_firstlineno} {rule.__doc__!r}")
+        else:
+            parts.append(f"{name} string {rule!r}")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:12]
+
+# optimize=1 caches the compiled token table in spl_lextab_<hash>.py and reuses
+# it on later imports. The hash covers every rule, so changing any rule makes
+# PLY build and cache a fresh table instead of loading a stale one.
+lexer = lex.lex(optimize=1, lextab=f'spl_lextab_{_rules_signature()}')
 
 # ============================================
 # TESTING
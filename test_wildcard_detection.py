@@ -1,6 +1,8 @@
 """
 Test script to verify wildcard vs multiplication detection
 """
+import ply.lex as lex
+
 import lexer
 
 test_cases = [
@@ -28,8 +30,11 @@ print("=" * 70)
 
 all_passed = True
 for test_name, test_code, expected_token in test_cases:
-    lexer.lexer.input(test_code)
-    tokens = list(lexer.lexer)
+    # Each case gets its own clone, so wildcard context state (brace depth)
+    # cannot leak from one case into the next
+    case_lexer = lexer.lexer.clone()
+    case_lexer.input(test_code)
+    tokens = list(case_lexer)
     
     # Find the * token
     asterisk_tokens = [t for t in tokens if t.value == '*']
@@ -51,6 +56,48 @@ for test_name, test_code, expected_token in test_cases:
         print(f"   ERROR: No * token found!")
         all_passed = False
 
+# Context state must be reset by input() and kept separate between clones
+print("\n" + "=" * 70)
+print("Testing Lexer Context State")
+print("=" * 70)
+
+state_cases = []
+
+# An unbalanced '{' in one input must not affect the next input()
+lexer.lexer.input("ROLE Admin {can: read,")
+list(lexer.lexer)
+lexer.lexer.input("3 * 4")
+state_cases.append(("State reset between input() calls", "3 * 4",
+                    "TIMES", list(lexer.lexer)))
+
+# Feeding a clone must not touch the original lexer's input or state
+lexer.lexer.input("ROLE Admin {can: *}")
+other_lexer = lexer.lexer.clone()
+other_lexer.input("3 * 4")
+list(other_lexer)
+state_cases.append(("Clone independent of original", "ROLE Admin {can: *}",
+                    "WILDCARD", list(lexer.lexer)))
+
+# A lexer built separately from the same rules (as a parser would) must
+# detect wildcards the same way as the module lexer
+module_lexer = lex.lex(module=lexer)
+for test_name, test_code, expected_token in [
+    ("Separate lexer: wildcard in braces", "ROLE A {can: read,\n *}", "WILDCARD"),
+    ("Separate lexer: wildcard after spaces", "ALLOW action:  * ON resource: x", "WILDCARD"),
+    ("Separate lexer: multiplication", "time.hour * 2", "TIMES"),
+]:
+    module_lexer.input(test_code)
+    state_cases.append((test_name, test_code, expected_token, list(module_lexer)))
+
+for test_name, test_code, expected_token, tokens in state_cases:
+    actual = [t.type for t in tokens if t.value == '*']
+    passed = actual == [expected_token]
+    if not passed:
+        all_passed = False
+    print(f"\n{'✓' if passed else '✗'} {test_name}")
+    print(f"   Input: {test_code}")
+    print(f"   Expected: {expected_token}, Got: {actual}")
+
 print("\n" + "=" * 70)
 if all_passed:
     print("✓ All tests passed!")